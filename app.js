@@ -1,6 +1,6 @@
 // Trading Day Picks — Submit Version (FULL FILE)
-// Reads: ./data/latest.json
-// Data rows expected: [date, open, high, low, close, volume]
+// Reads: ./data/latest.json.gz
+// Per-ticker data expected as columns: { d, o, h, l, c, v }
 //
 // Features included:
 // - Auto-run on load + manual run button
@@ -51,14 +51,13 @@ async function run(isManualClick) {
     if (outEl) outEl.innerHTML = "";
 
     // Fetch data
-    const res = await fetch("./data/latest.json", { cache: "no-store" });
-    if (!res.ok) {
-      status("Could not load data/latest.json (404 or blocked).");
-      if (outEl) outEl.innerHTML = `<p class="small">Fetch failed. Check that <code>data/latest.json</code> exists in your repo.</p>`;
+    const json = await loadData();
+    if (!json) {
+      status("Could not load data/latest.json.gz (404 or blocked).");
+      if (outEl) outEl.innerHTML = `<p class="small">Fetch failed. Check that <code>data/latest.json.gz</code> exists in your repo.</p>`;
       return;
     }
 
-    const json = await res.json();
     const tickers = json.tickers || {};
 
     const { riskOn, riskOnShort, spyLast, spyMA200, spyMA50 } = computeMarketRegime(tickers);
@@ -72,15 +71,15 @@ async function run(isManualClick) {
     const results = [];
 
     for (const ticker in tickers) {
-      const rows = tickers[ticker];
-      if (!rows || rows.length < MIN_HISTORY) continue;
+      const series = tickers[ticker];
+      if (!series || series.c.length < MIN_HISTORY) continue;
 
-      // OHLCV: [d,o,h,l,c,v]
+      // OHLCV columns: {d,o,h,l,c,v}
       // If your file uses a different schema, this will error and you'll see it on-page.
-      const highs  = rows.map(r => r[2]);
-      const lows   = rows.map(r => r[3]);
-      const closes = rows.map(r => r[4]);
-      const vols   = rows.map(r => r[5]);
+      const highs  = series.h;
+      const lows   = series.l;
+      const closes = series.c;
+      const vols   = series.v;
 
       const lastClose = last(closes);
       if (!Number.isFinite(lastClose)) continue;
@@ -220,7 +219,7 @@ async function run(isManualClick) {
     if (outEl) {
       outEl.innerHTML = `
         <p class="small"><b>Crash:</b> ${escapeHtml(msg)}</p>
-        <p class="small">Common causes: missing <code>data/latest.json</code>, invalid JSON, or wrong data schema.</p>
+        <p class="small">Common causes: missing <code>data/latest.json.gz</code>, invalid JSON, or wrong data schema.</p>
       `;
     }
   }
@@ -354,14 +353,28 @@ function corr(a, b) {
   return den === 0 ? NaN : (num / den);
 }
 
+// -------------------- Data loading --------------------
+
+async function loadData() {
+  const gz = await fetch("./data/latest.json.gz", { cache: "no-store" });
+  if (!gz.ok) return null;
+  const bytes = new Uint8Array(await gz.arrayBuffer());
+  // Some hosts already decode it (Content-Encoding: gzip); only inflate real gzip bytes
+  if (bytes[0] === 0x1f && bytes[1] === 0x8b) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+    return await new Response(stream).json();
+  }
+  return JSON.parse(new TextDecoder().decode(bytes));
+}
+
 // -------------------- Regime + Late-month --------------------
 
 function computeMarketRegime(tickers) {
   const spy = tickers["SPY"];
-  if (!spy || spy.length < 210) {
+  if (!spy || spy.c.length < 210) {
     return { riskOn: true, riskOnShort: true, spyLast: NaN, spyMA200: NaN, spyMA50: NaN };
   }
-  const spyCloses = spy.map(r => r[4]); // close
+  const spyCloses = spy.c; // close
   const spyLast = last(spyCloses);
   const spyMA200 = sma(spyCloses, 200);
   const spyMA50 = sma(spyCloses, 50);
@@ -436,9 +449,9 @@ function relStrength60(tickersObj, tkr) {
   const spy = tickersObj["SPY"];
   const x = tickersObj[tkr];
   if (!spy || !x) return null;
-  if (spy.length < 70 || x.length < 70) return null;
-  const spyCloses = spy.map(r => r[4]);
-  const xCloses = x.map(r => r[4]);
+  if (spy.c.length < 70 || x.c.length < 70) return null;
+  const spyCloses = spy.c;
+  const xCloses = x.c;
   const spyR = ret(spyCloses, 60);
   const xR = ret(xCloses, 60);
   if (spyR === null || xR === null) return null;
@@ -1,40 +1,93 @@
+import csv
+import hashlib
+import io
+import os
 import re
 from pathlib import Path
-from urllib.request import urlopen
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
 
 NASDAQ_LISTED = "https://www.nasdaqtrader.com/dynamic/symdir/nasdaqlisted.txt"
 OTHER_LISTED  = "https://www.nasdaqtrader.com/dynamic/symdir/otherlisted.txt"
 
+CACHE_DIR = Path("data/.cache")
+
 MAX_TICKERS = 1200  # <-- Aggressive 1200
 
 # Aggressive filters: keep symbols that are likely "real tradable" common stocks/ETFs
 # We'll still rely on your price>=5 filter later when fetching.
 BAD_SUBSTR = ("^", "/", " ", "$")
 BAD_SUFFIXES = ("W", "WS", "U", "R", "P")  # warrants/units/rights/preferred-like patterns (imperfect)
+_BAD_SET = frozenset(BAD_SUBSTR)   # all single characters
+_ALLOWED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-")
+_ROW = re.compile(r"^[ \t]*(?P<sym>[A-Z0-9.\-]+)[ \t]*\|[^\n]*$",
+                  re.MULTILINE | re.IGNORECASE | re.ASCII)
 
 def download(url: str) -> str:
-    with urlopen(url, timeout=30) as r:
-        return r.read().decode("utf-8", errors="replace")
+    # conditional GET against an on-disk copy so reruns skip unchanged files
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    body_path = CACHE_DIR / f"{key}.txt"
+    etag_path = CACHE_DIR / f"{key}.etag"
+    lm_path = CACHE_DIR / f"{key}.lastmod"
+
+    req = Request(url)
+    if body_path.exists():
+        if etag_path.exists():
+            req.add_header("If-None-Match", etag_path.read_text(encoding="utf-8"))
+        if lm_path.exists():
+            req.add_header("If-Modified-Since", lm_path.read_text(encoding="utf-8"))
+
+    try:
+        with urlopen(req, timeout=30) as r:
+            text = r.read().decode("utf-8", errors="replace")
+            etag = r.headers.get("ETag")
+            lastmod = r.headers.get("Last-Modified")
+    except HTTPError as e:
+        if e.code == 304 and body_path.exists():
+            return body_path.read_text(encoding="utf-8")
+        raise
+
+    write_atomic(body_path, text)
+    for path, val in ((etag_path, etag), (lm_path, lastmod)):
+        if val:
+            write_atomic(path, val)
+        elif path.exists():
+            path.unlink()
+    return text
+
+def write_atomic(path: Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
 
 def parse_pipe_file(text: str, symbol_col: str):
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    header = lines[0].split("|")
-    si = header.index(symbol_col)
+    # Fast path: when the symbol is the first column (true for both NASDAQ
+    # directory files) one regex pass pulls out every valid symbol, with the
+    # same strip/upper as the csv path below. Footer lines contain spaces or
+    # colons inside the first field so they never match.
+    header, _, body = text.partition("\n")
+    if header.split("|", 1)[0].strip() == symbol_col:
+        return [m.group("sym").upper() for m in _ROW.finditer(body)]
+
+    # security names may contain stray quotes, so don't let csv interpret them
+    reader = csv.reader(io.StringIO(text), delimiter="|", quoting=csv.QUOTE_NONE)
+    header = next((row for row in reader if row), [])
+    si = [h.strip() for h in header].index(symbol_col)
 
     syms = []
-    for ln in lines[1:]:
-        if ln.startswith("File Creation Time") or ln.startswith("Total Records"):
+    for row in reader:
+        if not row or row[0].startswith(("File Creation Time", "Total Records")):
             continue
-        parts = ln.split("|")
-        if len(parts) <= si:
+        if len(row) <= si:
             continue
-        sym = parts[si].strip().upper()
+        sym = row[si].strip().upper()
         if not sym:
             continue
         # drop obvious bads
-        if any(x in sym for x in BAD_SUBSTR):
+        if not _BAD_SET.isdisjoint(sym):
             continue
-        if re.search(r"[^A-Z0-9.\-]", sym):
+        if not _ALLOWED.issuperset(sym):
             continue
         syms.append(sym)
     return syms
@@ -52,9 +105,9 @@ def is_reasonable(sym: str) -> bool:
         return False
     # Filter suffix patterns common to warrants/units (approx)
     # Example: ABCW, ABCWS, ABCU
-    for suf in BAD_SUFFIXES:
-        if base.endswith(suf) and len(base) > len(suf):
-            return False
+    # (a bare suffix like "W" or "WS" is itself a valid ticker)
+    if base.endswith(BAD_SUFFIXES) and base not in BAD_SUFFIXES:
+        return False
     return True
 
 def main():
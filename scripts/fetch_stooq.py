@@ -1,58 +1,180 @@
+import csv
+import gzip
+import http.client
 import json
+import os
+import shutil
+import threading
 import time
-import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
 
+try:
+    import orjson   # much faster encoder; optional, falls back to stdlib json
+except ImportError:
+    orjson = None
+
 MIN_PRICE = 5.0
+KEEP_ROWS = 260   # ~1 trading year
+ROW_SLACK = 40    # extra raw rows kept in case some fail to parse
+
+# Stooq is pure network I/O, so many requests can be in flight at once.
+# Tune via env if Stooq starts throttling.
+MAX_WORKERS = int(os.environ.get("STOOQ_WORKERS", "16"))
+MAX_RPS = float(os.environ.get("STOOQ_MAX_RPS", "20"))  # global cap, 0 = off
+PLAIN_JSON = os.environ.get("STOOQ_PLAIN_JSON", "") == "1"
+
+CACHE_DIR = Path("data/.cache/stooq")
+
+STOOQ_HOST = "stooq.com"
+HEADERS = {"Accept-Encoding": "gzip", "Connection": "keep-alive"}
+
+_local = threading.local()
+_rate_lock = threading.Lock()
+_next_slot = 0.0
+
+def throttle():
+    # simple global pacer shared by all worker threads
+    global _next_slot
+    if MAX_RPS <= 0:
+        return
+    with _rate_lock:
+        now = time.monotonic()
+        wait = _next_slot - now
+        _next_slot = max(now, _next_slot) + 1.0 / MAX_RPS
+    if wait > 0:
+        time.sleep(wait)
 
 def force_fetch(ticker: str):
     try:
-        series = parse_ohlcv(fetch_csv(ticker))
-        return series
+        with fetch_csv(ticker) as f:
+            return parse_ohlcv(f)
     except:
         return None
 
-def fetch_csv(ticker: str) -> str:
+def _conn() -> http.client.HTTPSConnection:
+    # one keep-alive connection per worker thread (http.client isn't thread-safe)
+    c = getattr(_local, "conn", None)
+    if c is None:
+        c = _local.conn = http.client.HTTPSConnection(STOOQ_HOST, timeout=30)
+    return c
+
+def _drop_conn(conn):
+    conn.close()
+    _local.conn = None
+
+def fetch_csv(ticker: str):
+    # Returns an open text file over the cached CSV. The response body is
+    # streamed to disk in chunks, so no full-body string is ever built.
     sym = ticker.lower() + ".us"
-    url = f"https://stooq.com/q/d/l/?s={sym}&i=d"
-    with urllib.request.urlopen(url, timeout=30) as r:
-        return r.read().decode("utf-8", errors="replace")
+    path = f"/q/d/l/?s={sym}&i=d"
+
+    # reruns on the same UTC day reuse the series already downloaded
+    cache = CACHE_DIR / f"{ticker}.csv"
+    today = datetime.now(timezone.utc).date()
+    if cache.exists():
+        mtime = datetime.fromtimestamp(cache.stat().st_mtime, tz=timezone.utc)
+        if mtime.date() == today:
+            return cache.open(encoding="utf-8", errors="replace", newline="")
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = cache.with_name(cache.name + ".tmp")
+    try:
+        for attempt in range(3):
+            throttle()   # retries are paced too
+            conn = _conn()
+            try:
+                conn.request("GET", path, headers=HEADERS)
+                r = conn.getresponse()
+                if r.status != 200:
+                    raise RuntimeError(f"{ticker}: HTTP {r.status}")
+                src = gzip.GzipFile(fileobj=r) if r.getheader("Content-Encoding", "") == "gzip" else r
+                head = src.read(100)
+                # throttled / unknown symbols come back as short text or HTML, not CSV
+                if len(head) < 100 or not head.startswith(b"Date,"):
+                    raise RuntimeError(f"{ticker}: not a Stooq CSV")
+                with tmp.open("wb") as f:
+                    f.write(head)
+                    shutil.copyfileobj(src, f)
+                break
+            except (http.client.HTTPException, OSError, EOFError):
+                # stale keep-alive socket, truncated gzip body or transient error:
+                # reconnect and retry
+                _drop_conn(conn)
+                if attempt == 2:
+                    raise
+                time.sleep(0.2 * 2 ** attempt)
+            except RuntimeError:
+                _drop_conn(conn)   # unread body left on the socket
+                raise
+    except BaseException:
+        tmp.unlink(missing_ok=True)   # no orphan .tmp for failed tickers
+        raise
+    os.replace(tmp, cache)
+    return cache.open(encoding="utf-8", errors="replace", newline="")
+
+def _converted(rows, di, prices):
+    for p in rows:
+        # rows are already length-checked, so only float() can fail here
+        try:
+            o, h, l, c, v = map(float, prices(p))
+        except ValueError:
+            continue
+        yield p[di].strip(), o, h, l, c, v
 
-def parse_ohlcv(csv_text: str):
-    lines = [ln.strip() for ln in csv_text.splitlines() if ln.strip()]
-    if len(lines) < 40:
+def parse_ohlcv(lines):
+    # lines: an open file or a list of CSV text lines
+    it = iter(lines)
+    first = next(it, "")
+    if not first.startswith("Date,"):
         return None
 
-    header = [h.strip().lower() for h in lines[0].split(",")]
+    header = [h.strip().lower() for h in next(csv.reader([first]))]
     needed = ["date","open","high","low","close","volume"]
     if any(k not in header for k in needed):
         return None
 
     idx = {k: header.index(k) for k in needed}
+    di, oi, hi, li, ci, vi = (idx[k] for k in needed)
+    max_idx = max(di, oi, hi, li, ci, vi)
+    prices = itemgetter(oi, hi, li, ci, vi)
+
+    # Stooq returns the full history (often 10k+ rows) but we only keep
+    # ~1 trading year, so tokenize everything in C and only float() the tail.
+    # Stooq is oldest-first; the first rows are also kept so newest-first
+    # data still yields the latest year rather than the oldest one. The
+    # windows carry some slack for malformed / null rows.
+    rows = (p for p in csv.reader(it) if len(p) > max_idx)
+    head = list(islice(rows, KEEP_ROWS + ROW_SLACK))
+    tail = deque(head, maxlen=KEEP_ROWS + ROW_SLACK)
+    tail.extend(rows)
+    if len(tail) < 220:   # short history, skip the float work
+        return None
 
-    rows = []
-    for ln in lines[1:]:
-        p = ln.split(",")
-        if len(p) <= max(idx.values()):
-            continue
-        try:
-            d = p[idx["date"]].strip()
-            o = float(p[idx["open"]])
-            h = float(p[idx["high"]])
-            l = float(p[idx["low"]])
-            c = float(p[idx["close"]])
-            v = float(p[idx["volume"]])
-        except:
-            continue
-        rows.append([d, o, h, l, c, v])
-
-    rows.sort(key=lambda x: x[0])
-    if len(rows) < 220:
+    newest_first = head[0][di].strip() > tail[-1][di].strip()
+    picked = list(islice(_converted(head if newest_first else reversed(tail), di, prices), KEEP_ROWS))
+    picked.reverse()
+
+    if len(picked) < KEEP_ROWS and len(head) == KEEP_ROWS + ROW_SLACK:
+        # too many bad rows near the end: rescan the whole input the slow way
+        if hasattr(lines, "seek"):
+            lines.seek(0)
+        again = iter(lines)
+        if again is not it or hasattr(lines, "seek"):
+            next(again, "")
+            rows = (p for p in csv.reader(again) if len(p) > max_idx)
+            picked = sorted(_converted(rows, di, prices), key=itemgetter(0))[-KEEP_ROWS:]
+
+    if len(picked) < 220:
         return None
-    if rows[-1][4] < MIN_PRICE:   # close
+    dd, oo, hh, ll, cc, vv = map(list, zip(*picked))
+    if cc[-1] < MIN_PRICE:   # close
         return None
-    return rows[-260:]            # ~1 trading year
+    return {"d": dd, "o": oo, "h": hh, "l": ll, "c": cc, "v": vv}
 
 def load_universe():
     p = Path("data/universe.txt")
@@ -60,48 +182,57 @@ def load_universe():
         raise RuntimeError("Missing data/universe.txt")
     out = []
     seen = set()
-    for line in p.read_text(encoding="utf-8").splitlines():
+    for line in p.read_bytes().splitlines():
         t = line.strip().upper()
-        if t and not t.startswith("#") and t not in seen:
+        if t and not t.startswith(b"#") and t not in seen:
             seen.add(t)
-            out.append(t)
+            out.append(t.decode("ascii"))   # Stooq tickers are ASCII
     return out
 
 def main():
-    # --- Force critical benchmarks ---
-for t in ["SPY", "QQQ", "IWM", "DIA"]:
-    s = force_fetch(t)
-    if s:
-        out["tickers"][t] = s
-
     universe = load_universe()
 
+    # --- Force critical benchmarks ---
+    benchmarks = ["SPY", "QQQ", "IWM", "DIA"]
+    todo = benchmarks + [t for t in universe if t not in benchmarks]
+
     out = {
         "updated_utc": datetime.now(timezone.utc).isoformat(),
         "source": "stooq",
-        "schema": "d,open,high,low,close,volume",
+        "schema": "columnar:d,o,h,l,c,v",
         "min_price": MIN_PRICE,
-        "count_requested": len(universe),
+        "count_requested": len(todo),
         "tickers": {}
     }
 
     ok = 0
-    for t in universe:
-    if t in ("SPY", "QQQ", "IWM", "DIA"):
-        continue
-
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(force_fetch, t): t for t in todo}
         try:
-            series = parse_ohlcv(fetch_csv(t))
-            if series:
-                out["tickers"][t] = series
-                ok += 1
-            time.sleep(0.12)
-        except:
-            pass
-
+            for fut in as_completed(futures):
+                series = fut.result()
+                if series:
+                    out["tickers"][futures[fut]] = series
+                    ok += 1
+        except BaseException:
+            # Ctrl-C etc.: drop queued tickers instead of draining the whole queue
+            ex.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    # keep output order stable regardless of completion order
+    out["tickers"] = {t: out["tickers"][t] for t in todo if t in out["tickers"]}
     out["count_loaded"] = ok
     Path("data").mkdir(parents=True, exist_ok=True)
-    Path("data/latest.json").write_text(json.dumps(out), encoding="utf-8")
+    payload = dump_json(out)
+    with gzip.open("data/latest.json.gz", "wb", compresslevel=6) as f:
+        f.write(payload)
+    if PLAIN_JSON:   # uncompressed copy for local debugging (git-ignored)
+        Path("data/latest.json").write_bytes(payload)
+
+def dump_json(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
 
 if __name__ == "__main__":
     main()